@@ -1,473 +1,1122 @@
-from __future__ import annotations
-
-import json
-import sqlite3
-from pathlib import Path
-from typing import Any, Dict, Iterable, Optional
-
-import pandas as pd
-
-from .settings import DB_PATH, SCHEMA_VERSION
-
-
-def get_db_path() -> Path:
-    return DB_PATH
-
-
-def _connect() -> sqlite3.Connection:
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA synchronous=NORMAL;")
-    return conn
-
-
-def init_db() -> None:
-    with _connect() as conn:
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS products (
-                code TEXT PRIMARY KEY,
-                last_modified_t INTEGER,
-                product_name TEXT,
-                brands TEXT,
-                categories TEXT,
-                countries TEXT,
-                nutriscore_grade TEXT,
-                ecoscore_grade TEXT,
-                nova_group INTEGER,
-                ecoscore_data_json TEXT,
-                nutriments_json TEXT,
-                raw_json TEXT
-            );
-            """
-        )
-
-        # Lightweight migrations for older DBs
-        _ensure_column(conn, "products", "ecoscore_grade", "TEXT")
-        _ensure_column(conn, "products", "nova_group", "INTEGER")
-        _ensure_column(conn, "products", "ecoscore_data_json", "TEXT")
-
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS meta (
-                key TEXT PRIMARY KEY,
-                value TEXT
-            );
-            """
-        )
-
-        # Meal tracking
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS meals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                created_at_utc TEXT NOT NULL DEFAULT (datetime('now'))
-            );
-            """
-        )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS meal_items (
-                meal_id INTEGER NOT NULL,
-                code TEXT NOT NULL,
-                FOREIGN KEY(meal_id) REFERENCES meals(id)
-            );
-            """
-        )
-
-        conn.execute(
-            "INSERT OR IGNORE INTO meta(key, value) VALUES('schema_version', ?)",
-            (SCHEMA_VERSION,),
-        )
-
-
-def upsert_products(products: Iterable[Dict[str, Any]]) -> int:
-    init_db()
-    rows = 0
-
-    with _connect() as conn:
-        cur = conn.cursor()
-        for p in products:
-            code = str(p.get("code") or "").strip()
-            if not code:
-                continue
-
-            nutriments = p.get("nutriments") or {}
-            ecoscore_data = p.get("ecoscore_data") or {}
-            cur.execute(
-                """
-                INSERT INTO products(
-                    code, last_modified_t, product_name, brands, categories, countries,
-                    nutriscore_grade, ecoscore_grade, nova_group, ecoscore_data_json,
-                    nutriments_json, raw_json
-                ) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(code) DO UPDATE SET
-                    last_modified_t=excluded.last_modified_t,
-                    product_name=excluded.product_name,
-                    brands=excluded.brands,
-                    categories=excluded.categories,
-                    countries=excluded.countries,
-                    nutriscore_grade=excluded.nutriscore_grade,
-                    ecoscore_grade=excluded.ecoscore_grade,
-                    nova_group=excluded.nova_group,
-                    ecoscore_data_json=excluded.ecoscore_data_json,
-                    nutriments_json=excluded.nutriments_json,
-                    raw_json=excluded.raw_json
-                """,
-                (
-                    code,
-                    _safe_int(p.get("last_modified_t")),
-                    _safe_text(p.get("product_name")),
-                    _safe_text(p.get("brands")),
-                    _safe_text(p.get("categories")),
-                    _safe_text(p.get("countries")),
-                    _safe_text(p.get("nutriscore_grade")),
-                    _safe_text(p.get("ecoscore_grade")),
-                    _safe_int(p.get("nova_group")),
-                    json.dumps(ecoscore_data, ensure_ascii=False),
-                    json.dumps(nutriments, ensure_ascii=False),
-                    json.dumps(p, ensure_ascii=False),
-                ),
-            )
-            rows += 1
-
-        conn.execute(
-            "INSERT OR REPLACE INTO meta(key, value) VALUES('last_sync_utc', datetime('now'))"
-        )
-        conn.commit()
-
-    return rows
-
-
-def read_meta() -> Dict[str, str]:
-    init_db()
-    with _connect() as conn:
-        cur = conn.execute("SELECT key, value FROM meta")
-        return {k: v for (k, v) in cur.fetchall()}
-
-
-def read_products_dataframe(limit: int = 200_000) -> pd.DataFrame:
-    init_db()
-    with _connect() as conn:
-        df = pd.read_sql_query(
-            """
-            SELECT
-                code,
-                last_modified_t,
-                product_name,
-                brands,
-                categories,
-                countries,
-                nutriscore_grade,
-                ecoscore_grade,
-                nova_group,
-                ecoscore_data_json,
-                nutriments_json
-            FROM products
-            ORDER BY last_modified_t DESC
-            LIMIT ?
-            """,
-            conn,
-            params=(limit,),
-        )
-
-    if df.empty:
-        return df
-
-    # Expand a few nutriments into columns (best-effort)
-    def nutr_value(row: str, key: str) -> Optional[float]:
-        try:
-            obj = json.loads(row) if row else {}
-            v = obj.get(key)
-            return float(v) if v is not None else None
-        except Exception:
-            return None
-
-    df["sugars_100g"] = df["nutriments_json"].apply(lambda s: nutr_value(s, "sugars_100g"))
-    df["salt_100g"] = df["nutriments_json"].apply(lambda s: nutr_value(s, "salt_100g"))
-    df["energy-kcal_100g"] = df["nutriments_json"].apply(lambda s: nutr_value(s, "energy-kcal_100g"))
-
-    # Carbon footprint (best-effort): either a nutriment or from ecoscore_data.agribalyse.co2_total
-    def carbon_from_ecoscore(row: str) -> Optional[float]:
-        try:
-            obj = json.loads(row) if row else {}
-            co2_total = (
-                obj.get("agribalyse", {}).get("co2_total")
-                if isinstance(obj, dict)
-                else None
-            )
-            if co2_total is None:
-                return None
-            # agribalyse co2_total is typically kg CO2e per kg product -> convert to g CO2e per 100g
-            return float(co2_total) * 100.0
-        except Exception:
-            return None
-
-    carbon_nutr = df["nutriments_json"].apply(lambda s: nutr_value(s, "carbon-footprint_100g"))
-    carbon_eco = df["ecoscore_data_json"].apply(carbon_from_ecoscore)
-    df["carbon_footprint_gco2e_100g"] = carbon_nutr
-    df.loc[df["carbon_footprint_gco2e_100g"].isna(), "carbon_footprint_gco2e_100g"] = carbon_eco
-
-    return df.drop(columns=["nutriments_json", "ecoscore_data_json"], errors="ignore")
-
-
-def get_product_row(code: str) -> Optional[Dict[str, Any]]:
-    code = str(code).strip()
-    if not code:
-        return None
-    df = read_products_dataframe(limit=200_000)
-    hit = df[df["code"] == code]
-    if hit.empty:
-        return None
-    return hit.iloc[0].to_dict()
-
-
-def search_products_by_name(query: str, limit: int = 25) -> pd.DataFrame:
-    init_db()
-    q = (query or "").strip()
-    if not q:
-        return pd.DataFrame()
-    with _connect() as conn:
-        df = pd.read_sql_query(
-            """
-            SELECT code, product_name, brands, nutriscore_grade, ecoscore_grade, nova_group, raw_json
-            FROM products
-            WHERE product_name LIKE ?
-            ORDER BY last_modified_t DESC
-            LIMIT ?
-            """,
-            conn,
-            params=(f"%{q}%", limit),
-        )
-    return df
-
-
-def get_products_by_codes(codes: list[str]) -> pd.DataFrame:
-    """Return basic product info for a list of barcodes.
-
-    Keeps UI fast by querying only the requested codes.
-    """
-    init_db()
-    cleaned = [str(c).strip() for c in codes if str(c).strip()]
-    if not cleaned:
-        return pd.DataFrame(columns=["code", "product_name", "brands", "raw_json"])
-
-    placeholders = ",".join(["?"] * len(cleaned))
-    sql = f"""
-        SELECT code, product_name, brands, raw_json
-        FROM products
-        WHERE code IN ({placeholders})
-    """
-
-    with _connect() as conn:
-        df = pd.read_sql_query(sql, conn, params=tuple(cleaned))
-
-    if df.empty:
-        return df
-
-    # Keep the original ordering of `codes`.
-    order = {code: i for i, code in enumerate(cleaned)}
-    df["_order"] = df["code"].map(order)
-    df = df.sort_values(by="_order", kind="stable").drop(columns=["_order"])
-    return df
-
-
-def add_meal(consumed_codes: list[str]) -> int:
-    """Persist a meal (list of product codes) and return meal_id."""
-    init_db()
-    codes = [str(c).strip() for c in consumed_codes if str(c).strip()]
-    if not codes:
-        raise ValueError("No product codes")
-
-    with _connect() as conn:
-        cur = conn.cursor()
-        cur.execute("INSERT INTO meals DEFAULT VALUES")
-        meal_id = int(cur.lastrowid)
-        cur.executemany(
-            "INSERT INTO meal_items(meal_id, code) VALUES(?, ?)",
-            [(meal_id, c) for c in codes],
-        )
-        conn.commit()
-    return meal_id
-
-
-def delete_meals_today() -> int:
-    """Delete meals created today (UTC) and their items.
-
-    Returns the number of meals deleted.
-    """
-    init_db()
-    with _connect() as conn:
-        cur = conn.execute("SELECT id FROM meals WHERE date(created_at_utc) = date('now')")
-        meal_ids = [int(r[0]) for r in cur.fetchall()]
-        if not meal_ids:
-            return 0
-
-        placeholders = ",".join(["?"] * len(meal_ids))
-        conn.execute(f"DELETE FROM meal_items WHERE meal_id IN ({placeholders})", meal_ids)
-        conn.execute(f"DELETE FROM meals WHERE id IN ({placeholders})", meal_ids)
-        conn.commit()
-        return len(meal_ids)
-
-
-def delete_all_meals() -> int:
-    """Delete all meals and their items.
-
-    Returns the number of meals deleted.
-    """
-    init_db()
-    with _connect() as conn:
-        cur = conn.execute("SELECT COUNT(1) FROM meals")
-        count = int(cur.fetchone()[0] or 0)
-        conn.execute("DELETE FROM meal_items")
-        conn.execute("DELETE FROM meals")
-        conn.commit()
-        return count
-
-
-def delete_code_from_all_meals(code: str) -> int:
-    """Delete a product code from all meals.
-
-    Returns the number of meal_items deleted.
-    """
-    init_db()
-    c = str(code or "").strip()
-    if not c:
-        return 0
-
-    with _connect() as conn:
-        cur = conn.execute("DELETE FROM meal_items WHERE code = ?", (c,))
-        deleted_items = int(cur.rowcount or 0)
-        # Cleanup: remove meals without any remaining items
-        conn.execute(
-            "DELETE FROM meals WHERE id NOT IN (SELECT DISTINCT meal_id FROM meal_items)"
-        )
-        conn.commit()
-
-    return deleted_items
-
-
-def read_consumed_items_today() -> pd.DataFrame:
-    """Returns products consumed today (UTC) with meal_id and created_at."""
-    init_db()
-    with _connect() as conn:
-        df = pd.read_sql_query(
-            """
-            SELECT mi.meal_id, m.created_at_utc, p.code, p.product_name, p.brands,
-                   p.nutriscore_grade, p.ecoscore_grade, p.nova_group,
-                   p.categories, p.countries,
-                   p.ecoscore_data_json, p.nutriments_json, p.raw_json
-            FROM meal_items mi
-            JOIN meals m ON m.id = mi.meal_id
-            JOIN products p ON p.code = mi.code
-            WHERE date(m.created_at_utc) = date('now')
-            ORDER BY m.created_at_utc DESC
-            """,
-            conn,
-        )
-
-    if df.empty:
-        return df
-
-    # Reuse the same carbon extraction
-    def nutr_value(row: str, key: str) -> Optional[float]:
-        try:
-            obj = json.loads(row) if row else {}
-            v = obj.get(key)
-            return float(v) if v is not None else None
-        except Exception:
-            return None
-
-    def carbon_from_ecoscore(row: str) -> Optional[float]:
-        try:
-            obj = json.loads(row) if row else {}
-            co2_total = obj.get("agribalyse", {}).get("co2_total") if isinstance(obj, dict) else None
-            if co2_total is None:
-                return None
-            return float(co2_total) * 100.0
-        except Exception:
-            return None
-
-    carbon_nutr = df["nutriments_json"].apply(lambda s: nutr_value(s, "carbon-footprint_100g"))
-    carbon_eco = df["ecoscore_data_json"].apply(carbon_from_ecoscore)
-    df["carbon_footprint_gco2e_100g"] = carbon_nutr
-    df.loc[df["carbon_footprint_gco2e_100g"].isna(), "carbon_footprint_gco2e_100g"] = carbon_eco
-
-    # Keep nutriments_json and raw_json for downstream metrics (diversity, additives, origin).
-    return df.drop(columns=["ecoscore_data_json"], errors="ignore")
-
-
-def read_consumed_items_since(days: int = 7) -> pd.DataFrame:
-    """Returns products consumed since N days ago (UTC)."""
-    init_db()
-    days = int(days)
-    if days < 1:
-        raise ValueError("days must be >= 1")
-
-    with _connect() as conn:
-        df = pd.read_sql_query(
-            """
-            SELECT mi.meal_id, m.created_at_utc, p.code, p.product_name, p.brands,
-                   p.nutriscore_grade, p.ecoscore_grade, p.nova_group,
-                   p.categories, p.countries,
-                   p.ecoscore_data_json, p.nutriments_json, p.raw_json
-            FROM meal_items mi
-            JOIN meals m ON m.id = mi.meal_id
-            JOIN products p ON p.code = mi.code
-            WHERE date(m.created_at_utc) >= date('now', ?)
-            ORDER BY m.created_at_utc DESC
-            """,
-            conn,
-            params=(f"-{days} day",),
-        )
-
-    if df.empty:
-        return df
-
-    def nutr_value(row: str, key: str) -> Optional[float]:
-        try:
-            obj = json.loads(row) if row else {}
-            v = obj.get(key)
-            return float(v) if v is not None else None
-        except Exception:
-            return None
-
-    def carbon_from_ecoscore(row: str) -> Optional[float]:
-        try:
-            obj = json.loads(row) if row else {}
-            co2_total = obj.get("agribalyse", {}).get("co2_total") if isinstance(obj, dict) else None
-            if co2_total is None:
-                return None
-            return float(co2_total) * 100.0
-        except Exception:
-            return None
-
-    carbon_nutr = df["nutriments_json"].apply(lambda s: nutr_value(s, "carbon-footprint_100g"))
-    carbon_eco = df["ecoscore_data_json"].apply(carbon_from_ecoscore)
-    df["carbon_footprint_gco2e_100g"] = carbon_nutr
-    df.loc[df["carbon_footprint_gco2e_100g"].isna(), "carbon_footprint_gco2e_100g"] = carbon_eco
-
-    return df.drop(columns=["ecoscore_data_json"], errors="ignore")
-
-
-def _safe_text(v: Any) -> str:
-    if v is None:
-        return ""
-    return str(v)
-
-
-def _safe_int(v: Any) -> Optional[int]:
-    try:
-        if v is None or v == "":
-            return None
-        return int(v)
-    except Exception:
-        return None
-
-
-def _ensure_column(conn: sqlite3.Connection, table: str, column: str, col_type: str) -> None:
-    cur = conn.execute(f"PRAGMA table_info({table})")
-    existing = {row[1] for row in cur.fetchall()}  # name is 2nd column
-    if column not in existing:
-        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from contextlib import closing
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+from .countries import normalize_countries
+from .settings import DB_PATH, OFF_CACHE_FAST_WRITES, SCHEMA_VERSION
+
+try:
+    # Optional accelerator for the three JSON columns written per product.
+    import orjson
+
+    def _json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode()
+
+except ImportError:
+
+    def _json_dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False)
+
+
+# Flipped off by init_db() on sqlite builds compiled without FTS5; the
+# name search then falls back to the LIKE scan.
+_FTS_AVAILABLE = True
+
+# Rows handed to each executemany inside the single upsert transaction:
+# large enough to amortize the call, small enough to bound memory when
+# the caller streams a lazy page generator.
+_UPSERT_BATCH_SIZE = 1000
+
+
+def get_db_path() -> Path:
+    return DB_PATH
+
+
+def db_change_token() -> tuple:
+    """Cheap token that changes whenever the cache content changes.
+
+    In WAL mode small writes land in the -wal sidecar without touching
+    the main file's mtime, so both files' (mtime, size) take part.
+    """
+    parts = []
+    for p in (DB_PATH, DB_PATH.with_name(DB_PATH.name + "-wal")):
+        try:
+            s = p.stat()
+            parts.append((s.st_mtime_ns, s.st_size))
+        except OSError:
+            parts.append((0, 0))
+    return tuple(parts)
+
+
+def _connect() -> sqlite3.Connection:
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    # Keep large upserts off disk-backed temp files and page faults.
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA mmap_size=268435456;")
+    conn.execute("PRAGMA cache_size=-64000;")
+    return conn
+
+
+_tls = threading.local()
+
+
+def get_conn() -> sqlite3.Connection:
+    """Long-lived read connection, opened once per thread.
+
+    Opening a connection and replaying the PRAGMAs costs about a
+    millisecond per call — noticeable when every widget triggers a few
+    queries. Streamlit reruns scripts in worker threads, so one
+    connection per thread avoids both that overhead and cross-thread
+    sharing; writes keep using short-lived `_connect()` connections so
+    their transactions stay isolated.
+    """
+    conn = getattr(_tls, "conn", None)
+    if conn is None:
+        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(DB_PATH)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        # Read-heavy tuning: memory-map the file, grow the page cache
+        # (~200 MB) and keep temp structures (aggregate sorts) in memory.
+        conn.execute("PRAGMA mmap_size=268435456;")
+        conn.execute("PRAGMA cache_size=-200000;")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+        _tls.conn = conn
+    return conn
+
+
+def init_db() -> None:
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS products (
+                code TEXT PRIMARY KEY,
+                last_modified_t INTEGER,
+                product_name TEXT,
+                brands TEXT,
+                categories TEXT,
+                countries TEXT,
+                countries_normalized TEXT,
+                origin_country TEXT,
+                nutriscore_grade TEXT,
+                ecoscore_grade TEXT,
+                nova_group INTEGER,
+                sugars_100g REAL,
+                salt_100g REAL,
+                energy_kcal_100g REAL,
+                proteins_100g REAL,
+                fiber_100g REAL,
+                fat_100g REAL,
+                carbohydrates_100g REAL,
+                saturated_fat_100g REAL,
+                carbon_footprint_gco2e_100g REAL,
+                additives_n INTEGER,
+                raw_json TEXT
+            );
+            """
+        )
+
+        # Lightweight migrations for older DBs
+        _ensure_column(conn, "products", "ecoscore_grade", "TEXT")
+        _ensure_column(conn, "products", "nova_group", "INTEGER")
+        _ensure_column(conn, "products", "countries_normalized", "TEXT")
+        _ensure_column(conn, "products", "origin_country", "TEXT")
+        _ensure_column(conn, "products", "sugars_100g", "REAL")
+        _ensure_column(conn, "products", "salt_100g", "REAL")
+        _ensure_column(conn, "products", "energy_kcal_100g", "REAL")
+        _ensure_column(conn, "products", "carbon_footprint_gco2e_100g", "REAL")
+        _ensure_column(conn, "products", "additives_n", "INTEGER")
+        _ensure_column(conn, "products", "proteins_100g", "REAL")
+        _ensure_column(conn, "products", "fiber_100g", "REAL")
+        _ensure_column(conn, "products", "fat_100g", "REAL")
+        _ensure_column(conn, "products", "carbohydrates_100g", "REAL")
+        _ensure_column(conn, "products", "saturated_fat_100g", "REAL")
+
+        # Indexes for the aggregate helpers: grade GROUP BY, MAX(last_modified_t)
+        # and the ORDER BY in read_products_dataframe, and the sugar median
+        # (plain column index now that the value is materialized).
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_products_nutri ON products(nutriscore_grade);")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_products_lastmod ON products(last_modified_t DESC);")
+        # Replaces the old json_extract expression index over nutriments_json.
+        conn.execute("DROP INDEX IF EXISTS idx_products_sugar;")
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_products_sugar_col
+            ON products(sugars_100g) WHERE sugars_100g IS NOT NULL;
+            """
+        )
+
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            """
+        )
+
+        # Meal tracking
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS meals (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at_utc TEXT NOT NULL DEFAULT (datetime('now'))
+            );
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS meal_items (
+                meal_id INTEGER NOT NULL,
+                code TEXT NOT NULL,
+                FOREIGN KEY(meal_id) REFERENCES meals(id)
+            );
+            """
+        )
+        # Expression index matching the consumed-items readers'
+        # WHERE date(created_at_utc) filters; code lookups already go
+        # through the products primary key.
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_meals_date ON meals(date(created_at_utc));"
+        )
+
+        conn.execute(
+            "INSERT OR IGNORE INTO meta(key, value) VALUES('schema_version', ?)",
+            (SCHEMA_VERSION,),
+        )
+
+        # One-time backfill for rows written before countries_normalized
+        # existed; guarded by a meta flag so later inits skip the scan.
+        done = conn.execute(
+            "SELECT value FROM meta WHERE key = 'countries_normalized_v1'"
+        ).fetchone()
+        if done is None:
+            rows = conn.execute(
+                """
+                SELECT code, countries FROM products
+                WHERE countries_normalized IS NULL AND countries IS NOT NULL AND countries <> ''
+                """
+            ).fetchall()
+            conn.executemany(
+                "UPDATE products SET countries_normalized = ? WHERE code = ?",
+                [(normalize_countries(countries), code) for (code, countries) in rows],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta(key, value) VALUES('countries_normalized_v1', '1')"
+            )
+
+        # Same deal for origin_country: extract it once from the stored raw
+        # payload so the map never has to reparse JSON per row.
+        done = conn.execute(
+            "SELECT value FROM meta WHERE key = 'origin_country_v1'"
+        ).fetchone()
+        if done is None:
+            rows = conn.execute(
+                "SELECT code, raw_json FROM products WHERE origin_country IS NULL"
+            ).fetchall()
+            updates = []
+            for code, raw_json in rows:
+                try:
+                    p = json.loads(raw_json) if raw_json else {}
+                except Exception:
+                    p = {}
+                updates.append((_origin_country(p if isinstance(p, dict) else {}), code))
+            conn.executemany(
+                "UPDATE products SET origin_country = ? WHERE code = ?", updates
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta(key, value) VALUES('origin_country_v1', '1')"
+            )
+
+        # Backfill the derived numeric columns: parse each stored payload
+        # once here so readers never touch JSON for these metrics again.
+        done = conn.execute(
+            "SELECT value FROM meta WHERE key = 'derived_numeric_v2'"
+        ).fetchone()
+        if done is None:
+            rows = conn.execute("SELECT code, raw_json FROM products").fetchall()
+            updates = []
+            for code, raw_json in rows:
+                try:
+                    p = json.loads(raw_json) if raw_json else {}
+                except Exception:
+                    p = {}
+                if not isinstance(p, dict):
+                    p = {}
+                updates.append((*_derived_numerics(p), code))
+            conn.executemany(
+                """
+                UPDATE products
+                SET sugars_100g = ?, salt_100g = ?, energy_kcal_100g = ?,
+                    carbon_footprint_gco2e_100g = ?, additives_n = ?,
+                    proteins_100g = ?, fiber_100g = ?, fat_100g = ?,
+                    carbohydrates_100g = ?, saturated_fat_100g = ?
+                WHERE code = ?
+                """,
+                updates,
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta(key, value) VALUES('derived_numeric_v2', '1')"
+            )
+
+        # Full-text index over names and brands for the search box. External
+        # content ('content=products') stores only the token index, and the
+        # triggers keep it in sync with upserts: ON CONFLICT DO UPDATE fires
+        # the UPDATE trigger, fresh rows the INSERT one.
+        global _FTS_AVAILABLE
+        try:
+            conn.execute(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                    code UNINDEXED,
+                    product_name,
+                    brands,
+                    content='products',
+                    content_rowid='rowid'
+                );
+                """
+            )
+            conn.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+                    INSERT INTO products_fts(rowid, code, product_name, brands)
+                    VALUES (new.rowid, new.code, new.product_name, new.brands);
+                END;
+                """
+            )
+            conn.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+                    INSERT INTO products_fts(products_fts, rowid, code, product_name, brands)
+                    VALUES ('delete', old.rowid, old.code, old.product_name, old.brands);
+                END;
+                """
+            )
+            conn.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE ON products BEGIN
+                    INSERT INTO products_fts(products_fts, rowid, code, product_name, brands)
+                    VALUES ('delete', old.rowid, old.code, old.product_name, old.brands);
+                    INSERT INTO products_fts(rowid, code, product_name, brands)
+                    VALUES (new.rowid, new.code, new.product_name, new.brands);
+                END;
+                """
+            )
+        except sqlite3.OperationalError:
+            _FTS_AVAILABLE = False
+
+        # One-time index build for rows written before the triggers existed.
+        # 'rebuild' repopulates from the content table, so it is idempotent.
+        if _FTS_AVAILABLE:
+            done = conn.execute(
+                "SELECT value FROM meta WHERE key = 'products_fts_v1'"
+            ).fetchone()
+            if done is None:
+                conn.execute("INSERT INTO products_fts(products_fts) VALUES('rebuild')")
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta(key, value) VALUES('products_fts_v1', '1')"
+                )
+
+
+@lru_cache(maxsize=1)
+def _init_db_once() -> None:
+    """Schema creation and migrations, run once per process.
+
+    The public helpers used to call init_db() on every query; the schema
+    cannot change mid-process, so the repeats only burned a connection
+    and the PRAGMA/migration churn.
+    """
+    init_db()
+
+
+def _origin_country(p: Dict[str, Any]) -> str:
+    """Best-effort origin country for a raw OFF product dict.
+
+    First listed `origins`, else the first `origins_tags` entry with its
+    language prefix dropped, else `manufacturing_places`, else the first
+    `countries` token (not an origin, but better than nothing).
+    """
+    origins = _safe_text(p.get("origins")).strip()
+    if origins:
+        return origins.split(",", 1)[0].strip()
+    origins_tags = p.get("origins_tags")
+    if isinstance(origins_tags, list) and origins_tags:
+        tag = str(origins_tags[0])
+        name = tag.split(":", 1)[-1].replace("-", " ").title().strip()
+        if name:
+            return name
+    mp = _safe_text(p.get("manufacturing_places")).strip()
+    if mp:
+        return mp.split(",", 1)[0].strip()
+    countries = _safe_text(p.get("countries")).strip()
+    if countries:
+        return countries.split(",", 1)[0].strip()
+    return ""
+
+
+def _derived_numerics(p: Dict[str, Any]) -> tuple:
+    """(sugars, salt, kcal, carbon, additives_n, proteins, fiber, fat,
+    carbohydrates, saturated_fat) extracted from a raw OFF product dict.
+
+    Carbon is the `carbon-footprint_100g` nutriment when present, else the
+    ecoscore agribalyse co2_total (kg CO2e/kg) converted to g CO2e/100g.
+    Additives follow the UI proxy: len(additives_tags), else additives_n.
+    """
+    nut = p.get("nutriments") or {}
+    if not isinstance(nut, dict):
+        nut = {}
+    sugars = _safe_float(nut.get("sugars_100g"))
+    salt = _safe_float(nut.get("salt_100g"))
+    kcal = _safe_float(nut.get("energy-kcal_100g"))
+
+    carbon = _safe_float(nut.get("carbon-footprint_100g"))
+    if carbon is None:
+        eco = p.get("ecoscore_data")
+        co2_total = eco.get("agribalyse", {}).get("co2_total") if isinstance(eco, dict) else None
+        co2_total = _safe_float(co2_total)
+        if co2_total is not None:
+            carbon = co2_total * 100.0
+
+    tags = p.get("additives_tags")
+    if isinstance(tags, list):
+        additives = len(tags)
+    else:
+        additives = _safe_int(p.get("additives_n")) or 0
+
+    return (
+        sugars,
+        salt,
+        kcal,
+        carbon,
+        additives,
+        _safe_float(nut.get("proteins_100g")),
+        _safe_float(nut.get("fiber_100g")),
+        _safe_float(nut.get("fat_100g")),
+        _safe_float(nut.get("carbohydrates_100g")),
+        _safe_float(nut.get("saturated-fat_100g")),
+    )
+
+
+def _upsert_row(p: Dict[str, Any]) -> Optional[tuple]:
+    code = str(p.get("code") or "").strip()
+    if not code:
+        return None
+    return (
+        code,
+        _safe_int(p.get("last_modified_t")),
+        _safe_text(p.get("product_name")),
+        _safe_text(p.get("brands")),
+        _safe_text(p.get("categories")),
+        _safe_text(p.get("countries")),
+        normalize_countries(_safe_text(p.get("countries"))),
+        _origin_country(p),
+        _safe_text(p.get("nutriscore_grade")),
+        _safe_text(p.get("ecoscore_grade")),
+        _safe_int(p.get("nova_group")),
+        *_derived_numerics(p),
+        _json_dumps(p),
+    )
+
+
+def upsert_products(products: Iterable[Dict[str, Any]], bulk: bool = False) -> int:
+    """Insert-or-update a batch of raw OFF product dicts.
+
+    `bulk=True` (or the OFF_CACHE_FAST_WRITES env flag) drops WAL and
+    fsyncs for the duration of the batch, which is worth several x on
+    full-dump ingests. Only use it from offline scripts: nothing may read
+    the DB concurrently, and a crash mid-batch loses the batch
+    (re-running the idempotent upsert recovers).
+
+    Conflicting rows whose last_modified_t hasn't advanced are skipped
+    inside SQLite, so re-polling an unchanged window rewrites no pages.
+    The returned count is rows processed, not rows written.
+    """
+    _init_db_once()
+    bulk = bulk or OFF_CACHE_FAST_WRITES
+    # One prepared statement reused per batch instead of a Python execute
+    # call per product; batching keeps memory bounded when the input is a
+    # lazy page generator rather than a list.
+    rows = (r for r in map(_upsert_row, products) if r is not None)
+    batch = list(islice(rows, _UPSERT_BATCH_SIZE))
+    if not batch:
+        return 0
+
+    total = 0
+    with closing(_connect()) as conn, conn:
+        if bulk:
+            try:
+                conn.execute("PRAGMA journal_mode=MEMORY;")
+            except sqlite3.OperationalError:
+                # Leaving WAL needs exclusive access; a live reader (the
+                # per-thread connections) keeps it open. Keep WAL and
+                # settle for skipping the fsyncs.
+                pass
+            conn.execute("PRAGMA synchronous=OFF;")
+        while batch:
+            conn.executemany(_UPSERT_SQL, batch)
+            total += len(batch)
+            batch = list(islice(rows, _UPSERT_BATCH_SIZE))
+        conn.execute(
+            "INSERT OR REPLACE INTO meta(key, value) VALUES('last_sync_utc', datetime('now'))"
+        )
+        conn.commit()
+        if bulk:
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+
+    return total
+
+
+# Module-level so every batch in every sync hits the same entry in
+# sqlite3's per-connection statement cache (keyed by SQL text identity).
+_UPSERT_SQL = """
+                INSERT INTO products(
+                    code, last_modified_t, product_name, brands, categories, countries,
+                    countries_normalized, origin_country, nutriscore_grade, ecoscore_grade,
+                    nova_group, sugars_100g, salt_100g, energy_kcal_100g,
+                    carbon_footprint_gco2e_100g, additives_n,
+                    proteins_100g, fiber_100g, fat_100g,
+                    carbohydrates_100g, saturated_fat_100g,
+                    raw_json
+                ) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(code) DO UPDATE SET
+                    last_modified_t=excluded.last_modified_t,
+                    product_name=excluded.product_name,
+                    brands=excluded.brands,
+                    categories=excluded.categories,
+                    countries=excluded.countries,
+                    countries_normalized=excluded.countries_normalized,
+                    origin_country=excluded.origin_country,
+                    nutriscore_grade=excluded.nutriscore_grade,
+                    ecoscore_grade=excluded.ecoscore_grade,
+                    nova_group=excluded.nova_group,
+                    sugars_100g=excluded.sugars_100g,
+                    salt_100g=excluded.salt_100g,
+                    energy_kcal_100g=excluded.energy_kcal_100g,
+                    carbon_footprint_gco2e_100g=excluded.carbon_footprint_gco2e_100g,
+                    additives_n=excluded.additives_n,
+                    proteins_100g=excluded.proteins_100g,
+                    fiber_100g=excluded.fiber_100g,
+                    fat_100g=excluded.fat_100g,
+                    carbohydrates_100g=excluded.carbohydrates_100g,
+                    saturated_fat_100g=excluded.saturated_fat_100g,
+                    raw_json=excluded.raw_json
+                WHERE excluded.last_modified_t IS NULL
+                   OR products.last_modified_t IS NULL
+                   OR excluded.last_modified_t > products.last_modified_t
+            """
+
+
+def read_meta() -> Dict[str, str]:
+    _init_db_once()
+    cur = get_conn().execute("SELECT key, value FROM meta")
+    return {k: v for (k, v) in cur.fetchall()}
+
+
+# Real table columns selectable in read_products_dataframe.
+_PRODUCT_BASE_COLUMNS = (
+    "code",
+    "last_modified_t",
+    "product_name",
+    "brands",
+    "categories",
+    "countries",
+    "countries_normalized",
+    "origin_country",
+    "nutriscore_grade",
+    "ecoscore_grade",
+    "nova_group",
+    "additives_n",
+)
+
+# Text columns are COALESCE'd to '' in SQL so no fillna pass is needed in pandas.
+_TEXT_BASE_COLUMNS = frozenset(
+    {
+        "code",
+        "product_name",
+        "brands",
+        "categories",
+        "countries",
+        "countries_normalized",
+        "origin_country",
+        "nutriscore_grade",
+        "ecoscore_grade",
+    }
+)
+
+# Numeric columns extracted from the JSON payloads at upsert time (see
+# _derived_numerics); the DataFrame names keep the OFF spelling, the SQL
+# side can't use the hyphen.
+_NUTRIMENT_COLUMNS = (
+    "sugars_100g",
+    "salt_100g",
+    "energy-kcal_100g",
+    "proteins_100g",
+    "fiber_100g",
+    "fat_100g",
+    "carbohydrates_100g",
+    "saturated-fat_100g",
+)
+_CARBON_COLUMN = "carbon_footprint_gco2e_100g"
+_DERIVED_SQL_COLUMNS = {
+    "sugars_100g": "sugars_100g",
+    "salt_100g": "salt_100g",
+    "energy-kcal_100g": "energy_kcal_100g",
+    "proteins_100g": "proteins_100g",
+    "fiber_100g": "fiber_100g",
+    "fat_100g": "fat_100g",
+    "carbohydrates_100g": "carbohydrates_100g",
+    "saturated-fat_100g": "saturated_fat_100g",
+    _CARBON_COLUMN: _CARBON_COLUMN,
+}
+
+# Declared Arrow types: the schema is known at dev time, so skip
+# pd.read_sql_query's per-row dtype inference entirely.
+_ARROW_TYPES: Dict[str, pa.DataType] = {
+    "code": pa.large_string(),
+    "last_modified_t": pa.int64(),
+    "product_name": pa.large_string(),
+    "brands": pa.large_string(),
+    "categories": pa.large_string(),
+    "countries": pa.large_string(),
+    "countries_normalized": pa.large_string(),
+    "origin_country": pa.large_string(),
+    "nutriscore_grade": pa.large_string(),
+    "ecoscore_grade": pa.large_string(),
+    "nova_group": pa.int64(),
+    "additives_n": pa.int64(),
+    "sugars_100g": pa.float64(),
+    "salt_100g": pa.float64(),
+    "energy-kcal_100g": pa.float64(),
+    "proteins_100g": pa.float64(),
+    "fiber_100g": pa.float64(),
+    "fat_100g": pa.float64(),
+    "carbohydrates_100g": pa.float64(),
+    "saturated-fat_100g": pa.float64(),
+    "carbon_footprint_gco2e_100g": pa.float64(),
+}
+
+
+def _projection(base_cols: list[str], derived_cols: list[str]) -> str:
+    """SELECT list for product reads: text columns COALESCE'd to '' and
+    derived columns aliased back to their OFF spelling."""
+    select_cols = [
+        f"COALESCE(\"{c}\", '') AS \"{c}\"" if c in _TEXT_BASE_COLUMNS else f'"{c}"'
+        for c in base_cols
+    ]
+    for c in derived_cols:
+        sql_name = _DERIVED_SQL_COLUMNS[c]
+        select_cols.append(f'"{sql_name}" AS "{c}"' if sql_name != c else f'"{c}"')
+    return ", ".join(select_cols)
+
+
+def read_products_dataframe(limit: int = 200_000, columns: list[str] | None = None) -> pd.DataFrame:
+    """Read products into a DataFrame, optionally projecting columns.
+
+    `columns` may mix table columns and derived ones (sugars_100g,
+    salt_100g, energy-kcal_100g, carbon_footprint_gco2e_100g). The derived
+    values are materialized at upsert time, so this never parses JSON and
+    never moves the blob columns out of SQLite. Results are memoized per
+    (db change token, limit, columns) so repeated reads of an unchanged
+    cache file skip SQLite entirely.
+    """
+    _init_db_once()
+    df = _cached_products_impl(db_change_token(), limit, tuple(columns) if columns is not None else None)
+    # Shallow copy: callers can add/drop columns without touching the
+    # memoized frame (copy-on-write keeps the buffers shared).
+    return df.copy(deep=False)
+
+
+@lru_cache(maxsize=4)
+def _cached_products_impl(token: tuple, limit: int, columns: Optional[tuple]) -> pd.DataFrame:
+    return _read_products_impl(limit, columns)
+
+
+def _read_products_impl(limit: int, columns: Optional[tuple]) -> pd.DataFrame:
+    if columns is None:
+        base_cols = list(_PRODUCT_BASE_COLUMNS)
+        derived_cols = [*_NUTRIMENT_COLUMNS, _CARBON_COLUMN]
+    else:
+        wanted = list(dict.fromkeys(columns))
+        base_cols = [c for c in wanted if c in _PRODUCT_BASE_COLUMNS]
+        derived_cols = [c for c in wanted if c in _DERIVED_SQL_COLUMNS]
+
+    cur = get_conn().execute(
+        f"""
+        SELECT {_projection(base_cols, derived_cols)}
+        FROM products
+        ORDER BY last_modified_t DESC
+        LIMIT ?
+        """,
+        (limit,),
+    )
+    names = [d[0] for d in cur.description]
+    rows = cur.fetchall()
+    # One contiguous Arrow column per field with its declared type —
+    # strings land in Arrow buffers, not per-row Python objects, and
+    # .str operations downstream dispatch to Arrow compute.
+    series = list(zip(*rows)) if rows else [[] for _ in names]
+    tbl = pa.table({name: pa.array(vals, type=_ARROW_TYPES[name]) for name, vals in zip(names, series)})
+    return tbl.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _category_condition(category: Optional[str]) -> tuple[str, tuple]:
+    """SQL condition + params mirroring the reporting tab's category filter.
+
+    LIKE is ASCII-case-insensitive, which matches the substring semantics
+    the UI needs for OFF's mostly-English category tags. LIKE
+    metacharacters in the category are escaped so names like
+    "100% pur jus" match literally instead of as wildcards.
+    """
+    if not category:
+        return "", ()
+    escaped = category.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return "categories LIKE '%' || ? || '%' ESCAPE '\\'", (escaped,)
+
+
+def count_products(category: Optional[str] = None) -> int:
+    _init_db_once()
+    cond, params = _category_condition(category)
+    where = f" WHERE {cond}" if cond else ""
+    cur = get_conn().execute(f"SELECT COUNT(*) FROM products{where}", params)
+    return int(cur.fetchone()[0] or 0)
+
+
+def _nutriment_sql_expr(key: str) -> tuple[str, tuple]:
+    """SQL expression + params reading one nutriment metric.
+
+    The known metrics are materialized columns; anything else falls back
+    to a json_extract over the raw payload's nutriments object.
+    """
+    col = _DERIVED_SQL_COLUMNS.get(key)
+    if col is not None:
+        return f'"{col}"', ()
+    return "CAST(json_extract(raw_json, ?) AS REAL)", (f'$.nutriments."{key}"',)
+
+
+def median_nutriment(key: str, category: Optional[str] = None) -> Optional[float]:
+    """Median of a nutriment metric, computed entirely in SQLite.
+
+    Avoids materializing the whole table in pandas just for one scalar.
+    """
+    _init_db_once()
+    expr, expr_params = _nutriment_sql_expr(key)
+    cond, params = _category_condition(category)
+    where = f"WHERE {expr} IS NOT NULL"
+    if cond:
+        where += f" AND {cond}"
+    cur = get_conn().execute(
+        f"""
+        SELECT {expr} AS v
+        FROM products
+        {where}
+        ORDER BY v
+        LIMIT 1
+        OFFSET (
+            SELECT (COUNT(*) - 1) / 2
+            FROM products
+            {where}
+        )
+        """,
+        (*expr_params, *expr_params, *params, *expr_params, *params),
+    )
+    row = cur.fetchone()
+    return float(row[0]) if row and row[0] is not None else None
+
+
+def median_sugar() -> Optional[float]:
+    """Median of sugars_100g (kept for the report script)."""
+    return median_nutriment("sugars_100g")
+
+
+def nutriment_values(key: str, category: Optional[str] = None) -> list[float]:
+    """Non-null values of one nutriment metric, for histogramming.
+
+    Transfers a single REAL column out of SQLite instead of a DataFrame.
+    """
+    _init_db_once()
+    expr, expr_params = _nutriment_sql_expr(key)
+    cond, params = _category_condition(category)
+    where = f"WHERE {expr} IS NOT NULL"
+    if cond:
+        where += f" AND {cond}"
+    cur = get_conn().execute(
+        f"SELECT {expr} FROM products {where}",
+        (*expr_params, *expr_params, *params),
+    )
+    return [float(v) for (v,) in cur.fetchall()]
+
+
+def nutriscore_counts(category: Optional[str] = None) -> Dict[str, int]:
+    """Product count per (upper-cased) Nutri-Score grade; '' groups the unknowns."""
+    _init_db_once()
+    cond, params = _category_condition(category)
+    where = f" WHERE {cond}" if cond else ""
+    cur = get_conn().execute(
+        f"SELECT UPPER(TRIM(COALESCE(nutriscore_grade, ''))), COUNT(*) FROM products{where} GROUP BY 1",
+        params,
+    )
+    return {str(k): int(v) for (k, v) in cur.fetchall()}
+
+
+def nova_counts(category: Optional[str] = None) -> Dict[int, int]:
+    """Product count per NOVA group, skipping rows without one."""
+    _init_db_once()
+    cond, params = _category_condition(category)
+    where = " WHERE nova_group IS NOT NULL"
+    if cond:
+        where += f" AND {cond}"
+    cur = get_conn().execute(
+        f"SELECT CAST(nova_group AS INTEGER), COUNT(*) FROM products{where} GROUP BY 1 ORDER BY 1",
+        params,
+    )
+    return {int(k): int(v) for (k, v) in cur.fetchall()}
+
+
+def max_last_modified() -> Optional[int]:
+    _init_db_once()
+    cur = get_conn().execute("SELECT MAX(last_modified_t) FROM products")
+    row = cur.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+def _top_tokens(column: str, n: int, category: Optional[str] = None) -> list[tuple[str, int]]:
+    """Top-N comma-separated tokens of a text column, counted in SQLite.
+
+    A recursive CTE splits the lists so the counting stays in SQL instead
+    of exploding a pandas Series.
+    """
+    _init_db_once()
+    cond, params = _category_condition(category)
+    where = f"WHERE {column} IS NOT NULL AND {column} <> ''"
+    if cond:
+        where += f" AND {cond}"
+    cur = get_conn().execute(
+        f"""
+        WITH RECURSIVE split(token, rest) AS (
+            SELECT '', {column} || ','
+            FROM products
+            {where}
+            UNION ALL
+            SELECT TRIM(SUBSTR(rest, 1, INSTR(rest, ',') - 1)),
+                   SUBSTR(rest, INSTR(rest, ',') + 1)
+            FROM split
+            WHERE rest <> ''
+        )
+        SELECT token, COUNT(*) AS cnt
+        FROM split
+        WHERE token <> ''
+        GROUP BY token
+        ORDER BY cnt DESC, token
+        LIMIT ?
+        """,
+        (*params, int(n)),
+    )
+    return [(str(b), int(c)) for (b, c) in cur.fetchall()]
+
+
+def top_brands(n: int = 20, category: Optional[str] = None) -> list[tuple[str, int]]:
+    """Top-N brands by product count."""
+    return _top_tokens("brands", n, category)
+
+
+def top_categories(n: int = 60) -> list[str]:
+    """Most common category tags, for the reporting dropdown."""
+    return [name for (name, _count) in _top_tokens("categories", n)]
+
+
+def get_product_row(code: str) -> Optional[Dict[str, Any]]:
+    """Single-product lookup through the code primary key.
+
+    Same column set as read_products_dataframe's default, but fetched as
+    one indexed point query instead of materializing the whole table.
+    """
+    _init_db_once()
+    code = str(code).strip()
+    if not code:
+        return None
+    projection = _projection(list(_PRODUCT_BASE_COLUMNS), [*_NUTRIMENT_COLUMNS, _CARBON_COLUMN])
+    cur = get_conn().execute(
+        f"SELECT {projection} FROM products WHERE code = ? LIMIT 1", (code,)
+    )
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return {d[0]: v for d, v in zip(cur.description, row)}
+
+
+def _fts_prefix_query(q: str) -> str:
+    """FTS5 MATCH expression: each token quoted and prefix-matched.
+
+    Quoting neutralizes FTS5 operators in user input (-, OR, ", parens),
+    and the trailing * keeps results live while the user is still typing.
+    """
+    tokens = [t.replace('"', '""') for t in q.split()]
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def search_products_by_name(query: str, limit: int = 25) -> pd.DataFrame:
+    _init_db_once()
+    q = (query or "").strip()
+    if not q:
+        return pd.DataFrame()
+    if _FTS_AVAILABLE:
+        return pd.read_sql_query(
+            """
+            SELECT p.code, p.product_name, p.brands, p.nutriscore_grade,
+                   p.ecoscore_grade, p.nova_group, p.raw_json
+            FROM products_fts f
+            JOIN products p ON p.rowid = f.rowid
+            WHERE products_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+            """,
+            get_conn(),
+            params=(_fts_prefix_query(q), limit),
+        )
+    # Fallback for sqlite builds without FTS5: the original substring scan.
+    return pd.read_sql_query(
+        """
+        SELECT code, product_name, brands, nutriscore_grade, ecoscore_grade, nova_group, raw_json
+        FROM products
+        WHERE product_name LIKE ?
+        ORDER BY last_modified_t DESC
+        LIMIT ?
+        """,
+        get_conn(),
+        params=(f"%{q}%", limit),
+    )
+
+
+# Past a few hundred items SQLite's IN(...) list gets planner-hostile;
+# bulk-load a temp table and join on the primary key instead.
+_CODES_IN_LIST_MAX = 500
+
+
+def get_products_by_codes(codes: list[str]) -> pd.DataFrame:
+    """Return basic product info for a list of barcodes.
+
+    Keeps UI fast by querying only the requested codes.
+    """
+    _init_db_once()
+    cleaned = list(dict.fromkeys(c for c in (str(c).strip() for c in codes) if c))
+    if not cleaned:
+        return pd.DataFrame(columns=["code", "product_name", "brands", "raw_json"])
+
+    conn = get_conn()
+    if len(cleaned) > _CODES_IN_LIST_MAX:
+        # TEMP tables are per-connection, so this never touches the DB file.
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted_codes (code TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM wanted_codes")
+        conn.executemany(
+            "INSERT OR IGNORE INTO wanted_codes(code) VALUES(?)", ((c,) for c in cleaned)
+        )
+        df = pd.read_sql_query(
+            """
+            SELECT p.code, p.product_name, p.brands, p.raw_json
+            FROM wanted_codes w
+            JOIN products p ON p.code = w.code
+            """,
+            conn,
+        )
+        conn.execute("DELETE FROM wanted_codes")
+        conn.commit()
+    else:
+        placeholders = ",".join(["?"] * len(cleaned))
+        df = pd.read_sql_query(
+            f"""
+            SELECT code, product_name, brands, raw_json
+            FROM products
+            WHERE code IN ({placeholders})
+            """,
+            conn,
+            params=tuple(cleaned),
+        )
+
+    if df.empty:
+        return df
+
+    # Keep the original ordering of `codes`: an ordered categorical sorts
+    # at C level instead of mapping a Python dict over every row.
+    df["code"] = pd.Categorical(df["code"], categories=cleaned, ordered=True)
+    df = df.sort_values("code", kind="stable").reset_index(drop=True)
+    df["code"] = df["code"].astype(str)
+    return df
+
+
+def add_meal(consumed_codes: list[str]) -> int:
+    """Persist a meal (list of product codes) and return meal_id."""
+    _init_db_once()
+    codes = [str(c).strip() for c in consumed_codes if str(c).strip()]
+    if not codes:
+        raise ValueError("No product codes")
+
+    with closing(_connect()) as conn, conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO meals DEFAULT VALUES")
+        meal_id = int(cur.lastrowid)
+        cur.executemany(
+            "INSERT INTO meal_items(meal_id, code) VALUES(?, ?)",
+            [(meal_id, c) for c in codes],
+        )
+        conn.commit()
+    return meal_id
+
+
+def delete_meals_today() -> int:
+    """Delete meals created today (UTC) and their items.
+
+    Returns the number of meals deleted.
+    """
+    _init_db_once()
+    with closing(_connect()) as conn, conn:
+        cur = conn.execute("SELECT id FROM meals WHERE date(created_at_utc) = date('now')")
+        meal_ids = [int(r[0]) for r in cur.fetchall()]
+        if not meal_ids:
+            return 0
+
+        placeholders = ",".join(["?"] * len(meal_ids))
+        conn.execute(f"DELETE FROM meal_items WHERE meal_id IN ({placeholders})", meal_ids)
+        conn.execute(f"DELETE FROM meals WHERE id IN ({placeholders})", meal_ids)
+        conn.commit()
+        return len(meal_ids)
+
+
+def delete_all_meals() -> int:
+    """Delete all meals and their items.
+
+    Returns the number of meals deleted.
+    """
+    _init_db_once()
+    with closing(_connect()) as conn, conn:
+        cur = conn.execute("SELECT COUNT(1) FROM meals")
+        count = int(cur.fetchone()[0] or 0)
+        conn.execute("DELETE FROM meal_items")
+        conn.execute("DELETE FROM meals")
+        conn.commit()
+        return count
+
+
+def delete_code_from_all_meals(code: str) -> int:
+    """Delete a product code from all meals.
+
+    Returns the number of meal_items deleted.
+    """
+    _init_db_once()
+    c = str(code or "").strip()
+    if not c:
+        return 0
+
+    with closing(_connect()) as conn, conn:
+        cur = conn.execute("DELETE FROM meal_items WHERE code = ?", (c,))
+        deleted_items = int(cur.rowcount or 0)
+        # Cleanup: remove meals without any remaining items
+        conn.execute(
+            "DELETE FROM meals WHERE id NOT IN (SELECT DISTINCT meal_id FROM meal_items)"
+        )
+        conn.commit()
+
+    return deleted_items
+
+
+def read_consumed_items_today() -> pd.DataFrame:
+    """Returns products consumed today (UTC) with meal_id and created_at."""
+    _init_db_once()
+    df = pd.read_sql_query(
+        """
+        SELECT mi.meal_id, m.created_at_utc, p.code, p.product_name, p.brands,
+               p.nutriscore_grade, p.ecoscore_grade, p.nova_group,
+               p.categories, p.countries, p.origin_country,
+               p.carbon_footprint_gco2e_100g, p.additives_n,
+               p.proteins_100g, p.fiber_100g, p.fat_100g,
+               p.carbohydrates_100g, p.saturated_fat_100g AS "saturated-fat_100g",
+               p.sugars_100g, p.salt_100g,
+               p.raw_json
+        FROM meal_items mi
+        JOIN meals m ON m.id = mi.meal_id
+        JOIN products p ON p.code = mi.code
+        WHERE date(m.created_at_utc) = date('now')
+        ORDER BY m.created_at_utc DESC
+        """,
+        get_conn(),
+    )
+
+    # All numeric metrics are materialized at upsert time; raw_json stays
+    # for thumbnails only.
+    return df
+
+
+def read_consumed_items_since(days: int = 7) -> pd.DataFrame:
+    """Returns products consumed since N days ago (UTC)."""
+    _init_db_once()
+    days = int(days)
+    if days < 1:
+        raise ValueError("days must be >= 1")
+
+    df = pd.read_sql_query(
+        """
+        SELECT mi.meal_id, m.created_at_utc, p.code, p.product_name, p.brands,
+               p.nutriscore_grade, p.ecoscore_grade, p.nova_group,
+               p.categories, p.countries, p.origin_country,
+               p.carbon_footprint_gco2e_100g, p.additives_n,
+               p.proteins_100g, p.fiber_100g, p.fat_100g,
+               p.carbohydrates_100g, p.saturated_fat_100g AS "saturated-fat_100g",
+               p.sugars_100g, p.salt_100g,
+               p.raw_json
+        FROM meal_items mi
+        JOIN meals m ON m.id = mi.meal_id
+        JOIN products p ON p.code = mi.code
+        WHERE date(m.created_at_utc) >= date('now', ?)
+        ORDER BY m.created_at_utc DESC
+        """,
+        get_conn(),
+        params=(f"-{days} day",),
+    )
+
+    # All numeric metrics are materialized at upsert time; raw_json stays
+    # for thumbnails only.
+    return df
+
+
+def _safe_text(v: Any) -> str:
+    if v is None:
+        return ""
+    return str(v)
+
+
+def _safe_float(v: Any) -> Optional[float]:
+    try:
+        if v is None or v == "":
+            return None
+        return float(v)
+    except Exception:
+        return None
+
+
+def _safe_int(v: Any) -> Optional[int]:
+    try:
+        if v is None or v == "":
+            return None
+        return int(v)
+    except Exception:
+        return None
+
+
+def _ensure_column(conn: sqlite3.Connection, table: str, column: str, col_type: str) -> None:
+    cur = conn.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cur.fetchall()}  # name is 2nd column
+    if column not in existing:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
@@ -0,0 +1,81 @@
+"""Country-name normalization shared by the ingest pipeline and the UI.
+
+OFF `countries` values mix languages and tag prefixes ("en:france");
+normalizing once at write time lets readers aggregate canonical names
+without re-running this per rerun.
+"""
+
+from __future__ import annotations
+
+import re
+
+# OFF often uses tags like "en:france".
+_TAG_RE = re.compile(r"^[a-z]{2}:", re.IGNORECASE)
+_WS_RE = re.compile(r"\s+")
+
+# Best-effort mapping: keep this small and pragmatic.
+COUNTRY_MAP = {
+    # English
+    "fr": "France",
+    "france": "France",
+    "germany": "Germany",
+    "united kingdom": "United Kingdom",
+    "uk": "United Kingdom",
+    "usa": "United States",
+    "united states": "United States",
+    "czech republic": "Czechia",
+    "bosnia herzegovina": "Bosnia and Herzegovina",
+    "north macedonia": "North Macedonia",
+    "switzerland": "Switzerland",
+    "romania": "Romania",
+    "italy": "Italy",
+    "australia": "Australia",
+    "belgium": "Belgium",
+    # French
+    "allemagne": "Germany",
+    "royaume uni": "United Kingdom",
+    "etats unis": "United States",
+    "tchequie": "Czechia",
+    "bosnie herzegovine": "Bosnia and Herzegovina",
+    "macedoine du nord": "North Macedonia",
+    "suisse": "Switzerland",
+    "roumanie": "Romania",
+    "italie": "Italy",
+    "australie": "Australia",
+    "belgique": "Belgium",
+    # German
+    "frankreich": "France",
+    "deutschland": "Germany",
+}
+
+
+def normalize_country_name(raw: str) -> str:
+    s = (raw or "").strip()
+    if not s:
+        return ""
+    s = _TAG_RE.sub("", s)
+    s = s.replace("_", " ").replace("-", " ")
+    s = _WS_RE.sub(" ", s).strip()
+
+    key = s.casefold()
+    if key in COUNTRY_MAP:
+        return COUNTRY_MAP[key]
+
+    # Title-case fallback (works for many Plotly country names).
+    return " ".join([w[:1].upper() + w[1:] for w in key.split()])
+
+
+def normalize_countries(value: str | None) -> str:
+    """Comma-joined canonical names for a raw comma-separated value.
+
+    Deduplicates while keeping first-seen order, so 'en:france, France'
+    collapses to 'France'.
+    """
+    if not value:
+        return ""
+    seen: list[str] = []
+    for token in str(value).split(","):
+        name = normalize_country_name(token)
+        if name and name not in seen:
+            seen.append(name)
+    return ",".join(seen)
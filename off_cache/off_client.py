@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Any, Dict, Iterable, Optional
 
@@ -8,6 +10,15 @@ import requests
 
 from .settings import OFF_BASE_URL, OFF_CA_BUNDLE, OFF_SSL_VERIFY, USER_AGENT
 
+try:
+    # Optional accelerator: OFF page payloads are a few hundred KB of JSON.
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
+# OFF asks clients to stay gentle; never fetch more pages than this at once.
+_MAX_CONCURRENT_PAGES = 4
+
 
 @dataclass(frozen=True)
 class SearchParams:
@@ -23,14 +34,35 @@ class SearchParams:
     )
 
 
+# Hoisted: the field list never changes, and building the frozen
+# dataclass per call (and per page) was pure allocation churn.
+_FIELDS = SearchParams().fields
+
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+
+
 def _session() -> requests.Session:
-    s = requests.Session()
-    s.headers.update({"User-Agent": USER_AGENT})
-    # Configure SSL verification for environments with custom trust stores.
-    if OFF_CA_BUNDLE:
-        s.verify = OFF_CA_BUNDLE
-    else:
-        s.verify = OFF_SSL_VERIFY
+    """Shared session, created once: reuses the TCP/TLS connection across
+    calls instead of paying a handshake per lookup.
+
+    Callers that need a different `verify` pass it per request; the
+    session default stays untouched.
+    """
+    global _SESSION
+    s = _SESSION
+    if s is None:
+        with _SESSION_LOCK:
+            s = _SESSION
+            if s is None:
+                s = requests.Session()
+                s.headers.update({"User-Agent": USER_AGENT})
+                # Configure SSL verification for environments with custom trust stores.
+                if OFF_CA_BUNDLE:
+                    s.verify = OFF_CA_BUNDLE
+                else:
+                    s.verify = OFF_SSL_VERIFY
+                _SESSION = s
     return s
 
 
@@ -54,37 +86,62 @@ def fetch_recent_products(
     """
 
     sess = _session()
-    if verify is not None:
-        sess.verify = verify
+    url = f"{OFF_BASE_URL}/cgi/search.pl"
 
-    for page in range(1, pages + 1):
-        url = f"{OFF_BASE_URL}/cgi/search.pl"
-        params = {
+    def _page_params(page: int) -> Dict[str, Any]:
+        return {
             "action": "process",
             "json": 1,
             "page": page,
             "page_size": page_size,
             "sort_by": "last_modified_t",
-            "fields": SearchParams().fields,
+            "fields": _FIELDS,
             # filter by country tag (best-effort)
             "countries_tags_en": country,
         }
 
-        r = sess.get(url, params=params, timeout=timeout_s)
-        if r.status_code in (400, 404, 422):
-            # Some OFF instances / query versions may not accept the filter param.
-            params.pop("countries_tags_en", None)
-            r = sess.get(url, params=params, timeout=timeout_s)
-        r.raise_for_status()
-        payload = r.json()
+    if sleep_s or pages <= 1:
+        # An explicit inter-request delay is a politeness knob; honor it
+        # by staying strictly sequential.
+        for page in range(1, pages + 1):
+            yield from _page_products(_fetch_page(sess, url, _page_params(page), timeout_s, verify))
+            if sleep_s and page < pages:
+                time.sleep(sleep_s)
+        return
+
+    # Each page stalls on a full round trip, so fetch them concurrently
+    # (capped — OFF rate limits) and yield in page order as they land.
+    with ThreadPoolExecutor(max_workers=min(_MAX_CONCURRENT_PAGES, pages)) as ex:
+        futures = [
+            ex.submit(_fetch_page, sess, url, _page_params(page), timeout_s, verify)
+            for page in range(1, pages + 1)
+        ]
+        for fut in futures:
+            yield from _page_products(fut.result())
+
+
+def _fetch_page(
+    sess: requests.Session,
+    url: str,
+    params: Dict[str, Any],
+    timeout_s: int,
+    verify: bool | str | None = None,
+) -> Dict[str, Any]:
+    # verify=None falls back to the session default in requests.
+    r = sess.get(url, params=params, timeout=timeout_s, verify=verify)
+    if r.status_code in (400, 404, 422):
+        # Some OFF instances / query versions may not accept the filter param.
+        params = {k: v for k, v in params.items() if k != "countries_tags_en"}
+        r = sess.get(url, params=params, timeout=timeout_s, verify=verify)
+    r.raise_for_status()
+    payload = _json_loads(r.content)
+    return payload if isinstance(payload, dict) else {}
 
-        products = payload.get("products") or []
-        for product in products:
-            if isinstance(product, dict) and product.get("code"):
-                yield product
 
-        if sleep_s:
-            time.sleep(sleep_s)
+def _page_products(payload: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+    for product in payload.get("products") or []:
+        if isinstance(product, dict) and product.get("code"):
+            yield product
 
 
 def fetch_product_by_code(
@@ -103,13 +160,10 @@ def fetch_product_by_code(
         return None
 
     sess = _session()
-    if verify is not None:
-        sess.verify = verify
-
     url = f"{OFF_BASE_URL}/api/v2/product/{code}.json"
-    params = {"fields": SearchParams().fields}
+    params = {"fields": _FIELDS}
 
-    r = sess.get(url, params=params, timeout=timeout_s)
+    r = sess.get(url, params=params, timeout=timeout_s, verify=verify)
     if r.status_code == 404:
         return None
     r.raise_for_status()
@@ -138,9 +192,6 @@ def search_products_by_name_online(
         return []
 
     sess = _session()
-    if verify is not None:
-        sess.verify = verify
-
     url = f"{OFF_BASE_URL}/cgi/search.pl"
     params = {
         "action": "process",
@@ -148,9 +199,9 @@ def search_products_by_name_online(
         "search_terms": q,
         "page": 1,
         "page_size": max(1, min(int(limit), 100)),
-        "fields": SearchParams().fields,
+        "fields": _FIELDS,
     }
-    r = sess.get(url, params=params, timeout=timeout_s)
+    r = sess.get(url, params=params, timeout=timeout_s, verify=verify)
     r.raise_for_status()
     payload = r.json()
     products = payload.get("products") or []
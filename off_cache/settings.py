@@ -19,6 +19,15 @@ OFF_BASE_URL = os.environ.get("OFF_BASE_URL", "https://world.openfoodfacts.org")
 OFF_SSL_VERIFY = os.environ.get("OFF_SSL_VERIFY", "1") not in ("0", "false", "False")
 OFF_CA_BUNDLE = os.environ.get("OFF_CA_BUNDLE")
 
+# OFF_CACHE_FAST_WRITES=1 makes upsert_products default to its bulk mode
+# (journal_mode=MEMORY, synchronous=OFF). Only for offline syncs: nothing
+# may read the DB concurrently, and a crash mid-batch loses the batch.
+OFF_CACHE_FAST_WRITES = os.environ.get("OFF_CACHE_FAST_WRITES", "0") not in (
+    "0",
+    "false",
+    "False",
+)
+
 # User-Agent: recommandé pour OFF
 USER_AGENT = os.environ.get(
     "OFF_USER_AGENT",
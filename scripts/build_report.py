@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import sys
 
@@ -12,15 +13,37 @@ REPO_ROOT = Path(__file__).resolve().parents[1]
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
-from off_cache.cache_db import read_products_dataframe
+from off_cache.cache_db import (
+    count_products,
+    max_last_modified,
+    median_sugar,
+    nutriscore_counts,
+    read_products_dataframe,
+    top_brands,
+)
+
+TABLE_ROWS = 200
+TABLE_COLUMNS = (
+    "code",
+    "product_name",
+    "brands",
+    "countries",
+    "nutriscore_grade",
+    "energy-kcal_100g",
+    "sugars_100g",
+    "salt_100g",
+    "last_modified_t",
+)
 
 
 def build_report(output_dir: Path, limit: int) -> None:
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    df = read_products_dataframe(limit=limit)
+    # Header metrics and chart inputs are aggregated in SQLite; pandas is
+    # only used for the small table extract at the bottom.
+    n_products = count_products()
 
-    if df.empty:
+    if n_products == 0:
         html = """<!doctype html>
 <html lang=\"fr\"><head><meta charset=\"utf-8\"><title>OpenFoodFacts – Rapport</title></head>
 <body><h1>OpenFoodFacts – Rapport</h1><p>Cache vide. Lance d'abord une mise à jour.</p></body></html>"""
@@ -28,48 +51,79 @@ def build_report(output_dir: Path, limit: int) -> None:
         (output_dir / ".nojekyll").write_text("", encoding="utf-8")
         return
 
-    # Metrics
-    sugars = pd.to_numeric(df.get("sugars_100g"), errors="coerce")
-    nutri = df.get("nutriscore_grade", pd.Series(dtype=str)).fillna("").astype(str).str.upper()
-    nutri_counts = nutri.value_counts().sort_index()
+    # Metrics (SQL aggregates)
+    sugar_median = median_sugar()
+    nutri_counts = dict(sorted(nutriscore_counts().items()))
+    max_ts = max_last_modified()
+    brands_top = top_brands(20)
+
+    # Table extract: only materialize the rows actually rendered, and only
+    # the columns the table shows (projection happens in SQL).
+    df = read_products_dataframe(limit=min(limit, TABLE_ROWS), columns=TABLE_COLUMNS)
 
     # Charts
     fig_nutri = None
-    if not nutri_counts.empty:
-        nutri_df = nutri_counts.reset_index()
-        # With pandas, the first column is typically named after the original series (e.g. 'nutriscore_grade')
-        nutri_x = nutri_df.columns[0]
+    if nutri_counts:
         fig_nutri = px.bar(
-            nutri_df,
-            x=nutri_x,
-            y="count",
-            labels={nutri_x: "Nutri-Score", "count": "Produits"},
+            x=list(nutri_counts.keys()),
+            y=list(nutri_counts.values()),
+            labels={"x": "Nutri-Score", "y": "Produits"},
             title="Nutri-Score (sur le cache)",
         )
 
-    brands = df.get("brands", pd.Series(dtype=str)).fillna("")
-    top_brands = (
-        brands[brands.str.len() > 0]
-        .str.split(",")
-        .explode()
-        .str.strip()
-        .value_counts()
-        .head(20)
-    )
-
     fig_brands = None
-    if not top_brands.empty:
-        brands_df = top_brands.reset_index()
-        brands_x = brands_df.columns[0]
+    if brands_top:
         fig_brands = px.bar(
-            brands_df,
-            x=brands_x,
-            y="count",
-            labels={brands_x: "Marque", "count": "Produits"},
+            x=[b for b, _ in brands_top],
+            y=[c for _, c in brands_top],
+            labels={"x": "Marque", "y": "Produits"},
             title="Top marques (20)",
         )
 
-    # Build HTML
+    cols = [c for c in TABLE_COLUMNS if c in df.columns]
+    # df is already capped to TABLE_ROWS in SQL; select the columns as a
+    # view instead of head().copy()-ing a second DataFrame.
+    table = df.loc[:, cols]
+
+    # HTML serialization (Plotly figures, pandas table) is independent
+    # pure-Python work; render the three fragments in parallel while the
+    # static header is assembled.
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        fut_nutri = (
+            ex.submit(fig_nutri.to_html, full_html=False, include_plotlyjs="cdn")
+            if fig_nutri is not None
+            else None
+        )
+        fut_brands = (
+            ex.submit(fig_brands.to_html, full_html=False, include_plotlyjs=False)
+            if fig_brands is not None
+            else None
+        )
+        fut_table = ex.submit(table.to_html, index=False, escape=True)
+
+        _build_html(
+            output_dir,
+            n_products=n_products,
+            sugar_median=sugar_median,
+            nutri_counts=nutri_counts,
+            max_ts=max_ts,
+            nutri_html=fut_nutri.result() if fut_nutri is not None else None,
+            brands_html=fut_brands.result() if fut_brands is not None else None,
+            table_html=fut_table.result(),
+        )
+
+
+def _build_html(
+    output_dir: Path,
+    *,
+    n_products: int,
+    sugar_median: float | None,
+    nutri_counts: dict,
+    max_ts: int | None,
+    nutri_html: str | None,
+    brands_html: str | None,
+    table_html: str,
+) -> None:
     parts: list[str] = []
     parts.append("<!doctype html>")
     parts.append('<html lang="fr">')
@@ -95,53 +149,42 @@ body{font-family:system-ui,-apple-system,Segoe UI,Roboto,Arial,sans-serif;margin
     parts.append('<p class="small">Généré automatiquement via GitHub Actions.</p>')
 
     parts.append('<div class="grid">')
-    parts.append(f'<div class="card"><div class="small">Produits</div><div><b>{len(df):,}</b></div></div>'.replace(",", " "))
+    n_fmt = format(n_products, ",").translate(str.maketrans(",", " "))
+    parts.append(f'<div class="card"><div class="small">Produits</div><div><b>{n_fmt}</b></div></div>')
     parts.append(
-        f'<div class="card"><div class="small">Sucre médian (g/100g)</div><div><b>{sugars.median():.1f}</b></div></div>'
-        if sugars.notna().any()
+        f'<div class="card"><div class="small">Sucre médian (g/100g)</div><div><b>{sugar_median:.1f}</b></div></div>'
+        if sugar_median is not None
         else '<div class="card"><div class="small">Sucre médian (g/100g)</div><div><b>—</b></div></div>'
     )
-    a_pct = (nutri_counts.get("A", 0) / max(1, len(df)) * 100.0) if not nutri_counts.empty else 0.0
+    a_pct = nutri_counts.get("A", 0) / max(1, n_products) * 100.0
     parts.append(f'<div class="card"><div class="small">Nutri-Score A (%)</div><div><b>{a_pct:.1f}</b></div></div>')
 
-    last_mod = pd.to_numeric(df.get("last_modified_t"), errors="coerce")
-    if last_mod.notna().any():
-        import datetime as dt
-
-        last_date = dt.datetime.utcfromtimestamp(int(last_mod.max())).strftime("%Y-%m-%d %H:%M UTC")
+    if max_ts is not None:
+        last_date = pd.Timestamp(int(max_ts), unit="s", tz="UTC").strftime("%Y-%m-%d %H:%M UTC")
     else:
         last_date = "—"
     parts.append(f'<div class="card"><div class="small">Dernière modif produit</div><div><b>{last_date}</b></div></div>')
     parts.append("</div>")
 
-    if fig_nutri is not None:
-        parts.append(fig_nutri.to_html(full_html=False, include_plotlyjs="cdn"))
-
-    if fig_brands is not None:
-        parts.append(fig_brands.to_html(full_html=False, include_plotlyjs=False))
-
-    cols = [
-        c
-        for c in [
-            "code",
-            "product_name",
-            "brands",
-            "countries",
-            "nutriscore_grade",
-            "energy-kcal_100g",
-            "sugars_100g",
-            "salt_100g",
-            "last_modified_t",
-        ]
-        if c in df.columns
-    ]
-    table = df[cols].head(200).copy()
-    parts.append("<h2>Extrait (200)</h2>")
-    parts.append(table.to_html(index=False, escape=True))
+    if nutri_html is not None:
+        parts.append(nutri_html)
+
+    if brands_html is not None:
+        parts.append(brands_html)
+
+    parts.append(f"<h2>Extrait ({TABLE_ROWS})</h2>")
+    parts.append(table_html)
 
     parts.append("</body></html>")
 
-    (output_dir / "index.html").write_text("\n".join(parts), encoding="utf-8")
+    # Stream the fragments straight to disk: joining first would
+    # double-buffer the page (mega-string plus its UTF-8 encoding), and
+    # the figure/table fragments dominate the size.
+    with open(output_dir / "index.html", "wb") as f:
+        for i, part in enumerate(parts):
+            if i:
+                f.write(b"\n")
+            f.write(part.encode("utf-8"))
     (output_dir / ".nojekyll").write_text("", encoding="utf-8")
 
 